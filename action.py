@@ -22,44 +22,91 @@ WRITE  = 2
 COMMIT = 3
 ABORT  = 4
 
+# An action's str and tex output depend only on its three fields, and the same
+# few distinct actions appear in many schedules, so each one is formatted at
+# most once and cached here.
+_strs = {}
+_texs = {}
+
 class Action(object):
+    # Schedules are lists of many small Actions that get scanned over and
+    # over, so slots are used to shrink instances and speed up attribute
+    # access. The hash is precomputed since actions are hashed heavily by the
+    # sets and dicts in serial.py.
+    __slots__ = ("op", "i", "obj", "_hash")
+
     def __init__(self, op, i, obj=None):
         self.op  = op  # operation:      READ, WRITE, COMMIT, or ABORT
         self.i   = i   # transaction id: 1, 2, 3, ...
         self.obj = obj # object:         A, B, C, ...
+        self._hash = hash((op, i, obj))
 
     def __eq__(self, other):
         return self.op == other.op and self.i == other.i and self.obj == other.obj
 
     def __hash__(self):
-        return hash((self.op, self.i, self.obj))
+        return self._hash
 
     def __str__(self):
-        if self.op == READ:
-            return "R_{}({})".format(self.i, self.obj)
-        elif self.op == WRITE:
-            return "W_{}({})".format(self.i, self.obj)
-        elif self.op == COMMIT:
-            return "Commit_{}".format(self.i)
-        elif self.op == ABORT:
-            return "Abort_{}".format(self.i)
-        else:
-            raise ValueError("invalid action type {}".format(self.op))
+        key = (self.op, self.i, self.obj)
+        if key not in _strs:
+            if self.op == READ:
+                s = "R_{}({})".format(self.i, self.obj)
+            elif self.op == WRITE:
+                s = "W_{}({})".format(self.i, self.obj)
+            elif self.op == COMMIT:
+                s = "Commit_{}".format(self.i)
+            elif self.op == ABORT:
+                s = "Abort_{}".format(self.i)
+            else:
+                raise ValueError("invalid action type {}".format(self.op))
+            _strs[key] = s
+        return _strs[key]
 
     def __repr__(self):
         return str(self)
 
+    def pack(self):
+        """
+        Packs an action into a single integer with the op in the high byte,
+        the transaction id in the middle byte, and the object (or 0 for
+        commits and aborts) in the low byte.
+
+        >>> r(1, "A").pack() == (READ << 16) | (1 << 8) | ord("A")
+        True
+        >>> commit(2).pack() == (COMMIT << 16) | (2 << 8)
+        True
+        """
+        obj = ord(self.obj) if self.obj is not None else 0
+        return (self.op << 16) | (self.i << 8) | obj
+
     def tex(self):
-        if self.op == READ:
-            return "$R_{{{}}}({})$".format(self.i, self.obj)
-        elif self.op == WRITE:
-            return "$W_{{{}}}({})$".format(self.i, self.obj)
-        elif self.op == COMMIT:
-            return "$\\text{{Commit}}_{{{}}}$".format(self.i)
-        elif self.op == ABORT:
-            return "$\\text{{Abort}}_{{{}}}$".format(self.i)
-        else:
-            raise ValueError("invalid action type {}".format(self.op))
+        key = (self.op, self.i, self.obj)
+        if key not in _texs:
+            if self.op == READ:
+                s = "$R_{{{}}}({})$".format(self.i, self.obj)
+            elif self.op == WRITE:
+                s = "$W_{{{}}}({})$".format(self.i, self.obj)
+            elif self.op == COMMIT:
+                s = "$\\text{{Commit}}_{{{}}}$".format(self.i)
+            elif self.op == ABORT:
+                s = "$\\text{{Abort}}_{{{}}}$".format(self.i)
+            else:
+                raise ValueError("invalid action type {}".format(self.op))
+            _texs[key] = s
+        return _texs[key]
+
+# The same few distinct actions appear in many schedules, so the factories
+# below intern them: every r(1, "A") they return is the same object. Actions
+# are never mutated, so the sharing is safe, and it saves an allocation per
+# repeated action.
+_actions = {}
+
+def _intern(op, i, obj=None):
+    key = (op, i, obj)
+    if key not in _actions:
+        _actions[key] = Action(op, i, obj)
+    return _actions[key]
 
 def r(t, obj):
     """
@@ -67,8 +114,10 @@ def r(t, obj):
 
     >>> r(1, "A")
     R_1(A)
+    >>> r(1, "A") is r(1, "A")
+    True
     """
-    return Action(READ, t, obj)
+    return _intern(READ, t, obj)
 
 def w(t, obj):
     """
@@ -77,7 +126,7 @@ def w(t, obj):
     >>> w(1, "A")
     W_1(A)
     """
-    return Action(WRITE, t, obj)
+    return _intern(WRITE, t, obj)
 
 def commit(t):
     """
@@ -86,7 +135,7 @@ def commit(t):
     >>> commit(1)
     Commit_1
     """
-    return Action(COMMIT, t)
+    return _intern(COMMIT, t)
 
 def abort(t):
     """
@@ -95,7 +144,7 @@ def abort(t):
     >>> abort(1)
     Abort_1
     """
-    return Action(ABORT, t)
+    return _intern(ABORT, t)
 
 if __name__ == "__main__":
     import doctest
@@ -10,11 +10,16 @@ If you run this script,
     (4) the conflict graphs will be written to conflict-graph-i.tex.
 """
 from action import *
+# The figures are only ever saved to disk, so use the headless Agg backend
+# and skip GUI backend initialization. This has to happen before anything
+# (including serial) imports pyplot.
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
 import hypothesis as hyp
 import hypothesis.strategies as st
 import random
 import serial
-import matplotlib.pyplot as plt
 
 def shuffle(xs, ys, r):
     """
@@ -27,43 +32,55 @@ def shuffle(xs, ys, r):
     >>> shuffle([1, 2, 3], ["a", "b", "c"], r) #doctest: +skip
     [1, 2, 'a', 'b', 'c', 3]
     """
-    shuffled_len = len(xs) + len(ys)
-    shuffled = [None] * shuffled_len
-    indices = range(shuffled_len)
-    xs_indices = sorted(r.sample(indices, len(xs)))
-    ys_indices = [i for i in indices if i not in xs_indices]
-
-    for (x, i) in zip(xs, xs_indices):
-        shuffled[i] = x
-
-    for (y, i) in zip(ys, ys_indices):
-        shuffled[i] = y
-
-    return shuffled
+    # Shuffle a boolean pattern of which positions come from xs, then merge
+    # the two lists in a single pass. This picks the same uniformly random
+    # interleavings as sampling indices for xs, without the quadratic
+    # membership scans.
+    pattern = [True] * len(xs) + [False] * len(ys)
+    r.shuffle(pattern)
+    xs = iter(xs)
+    ys = iter(ys)
+    return [next(xs) if from_xs else next(ys) for from_xs in pattern]
 
 def shuffles(ls, r):
     """Shuffle a list of lists."""
     return reduce(lambda xs, ys: shuffle(xs, ys, r), ls, [])
 
+# The leaf strategies never change, so they are built once at module scope
+# (sampled_from is also cheaper than a one_of over justs), and the
+# per-transaction strategies are memoized on the transaction id. Hypothesis
+# asks for fresh transactions constantly while shrinking, and rebuilding the
+# strategies on every draw is pure overhead.
+_objects               = st.sampled_from([X, Y, Z])
+_read_or_write_types   = st.sampled_from([READ, WRITE])
+_commit_or_abort_types = st.sampled_from([COMMIT, ABORT])
+_read_or_writes        = {}
+_commit_or_aborts      = {}
+
 def object():
     """Random object (e.g. A, B, X, Y, Z)."""
-    return st.one_of([st.just(X), st.just(Y), st.just(Z)])
+    return _objects
 
 def read_or_write_type():
     """READ or WRITE."""
-    return st.one_of([st.just(READ), st.just(WRITE)])
+    return _read_or_write_types
 
 def commit_or_abort_type():
     """COMMIT or ABORT."""
-    return st.one_of([st.just(COMMIT), st.just(ABORT)])
+    return _commit_or_abort_types
 
 def read_or_write(i):
     """Random read or write on random object by transaction i."""
-    return st.tuples(read_or_write_type(), object()).map(lambda (t, o): Action(t, i, o))
+    if i not in _read_or_writes:
+        _read_or_writes[i] = \
+            st.tuples(read_or_write_type(), object()).map(lambda to: Action(to[0], i, to[1]))
+    return _read_or_writes[i]
 
 def commit_or_abort(i):
     """Random commit or abort transaction i."""
-    return commit_or_abort_type().map(lambda t: Action(t, i, None))
+    if i not in _commit_or_aborts:
+        _commit_or_aborts[i] = commit_or_abort_type().map(lambda t: Action(t, i, None))
+    return _commit_or_aborts[i]
 
 def number_of_txns():
     """Random number of transactions >=2."""
@@ -73,7 +90,7 @@ def transaction(i):
     """Random transaction by transaction i."""
     rws = st.lists(elements=read_or_write(i), min_size=1, max_size=3)
     ca  = commit_or_abort(i)
-    return st.tuples(rws, ca).map(lambda (rws, ca): rws + [ca])
+    return st.tuples(rws, ca).map(lambda rws_ca: rws_ca[0] + [rws_ca[1]])
 
 def schedule():
     """Random schedule of transactions."""
@@ -85,19 +102,38 @@ def schedule():
         )))
 
 def main():
+    # Hypothesis's shrinker evaluates the predicates on thousands of
+    # overlapping schedules, so memoize each one on the (hashable) tuple of
+    # actions to make revisits free.
+    def memoized(p):
+        cache = {}
+        def q(sched):
+            key = tuple(sched)
+            if key not in cache:
+                cache[key] = p(sched)
+            return cache[key]
+        return q
+
     # abbreviations
-    vs  = serial.view_serializable
-    cs  = serial.conflict_serializable
-    rec = serial.recoverable
-    aca = serial.aca
-    sct = serial.strict
+    vs  = memoized(serial.view_serializable)
+    cs  = memoized(serial.conflict_serializable)
+    rec = memoized(serial.recoverable)
+    aca = memoized(serial.aca)
+    sct = memoized(serial.strict)
 
     # boolean logic predicate combinators
     def neg(p): return lambda s: not p(s)
     def all_of(ps): return lambda s: all([p(s) for p in ps])
 
+    # Each schedule is characterized once in show and again when short-sol.tex
+    # is written, and every predicate re-walks the schedule, so cache the
+    # results keyed on the (hashable) tuple of actions.
+    characterized = {}
     def characterize(sched):
-        return [vs(sched), cs(sched), rec(sched), aca(sched), sct(sched)]
+        key = tuple(sched)
+        if key not in characterized:
+            characterized[key] = [vs(sched), cs(sched), rec(sched), aca(sched), sct(sched)]
+        return characterized[key]
 
     def short_bool(b):
         return "T" if b else "F"
@@ -154,10 +190,14 @@ def main():
         for s in schedules:
             f.write(serial.tex(s) + "\n")
 
+    # Reuse one figure for all the conflict graphs rather than allocating and
+    # tearing one down per schedule.
+    (fig, ax) = plt.subplots()
     for (i, s) in enumerate(schedules, 1):
-        serial.draw(serial.conflict_graph(s))
-        plt.savefig("conflict-graph-{}.pdf".format(i))
-        plt.close()
+        ax.clear()
+        serial.draw(serial.conflict_graph(s), ax=ax)
+        fig.savefig("conflict-graph-{}.pdf".format(i))
+    plt.close(fig)
 
 if __name__ == "__main__":
     main()
@@ -14,7 +14,6 @@ a conflict graph using matplotlib.
 from action import *
 from collections import defaultdict
 import itertools
-import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 
@@ -56,6 +55,52 @@ def graphs_eq(g1, g2):
     return (set(g1.nodes()) == set(g2.nodes()) and
             set(g1.edges()) == set(g2.edges()))
 
+def schedule_to_arrays(schedule):
+    """
+    Converts a schedule into three parallel numpy arrays of ops, transaction
+    ids, and objects (0 for commits and aborts): a structure-of-arrays layout
+    that vectorized code can scan without chasing Action attributes.
+
+    >>> (ops, ids, objs) = schedule_to_arrays([r(1, "A"), w(2, "B"), commit(1)])
+    >>> list(ops) == [READ, WRITE, COMMIT]
+    True
+    >>> list(ids)
+    [1, 2, 1]
+    >>> list(objs) == [ord("A"), ord("B"), 0]
+    True
+    """
+    ops  = np.array([a.op for a in schedule], dtype=np.uint8)
+    ids  = np.array([a.i for a in schedule], dtype=np.uint8)
+    objs = np.array([ord(a.obj) if a.obj is not None else 0 for a in schedule],
+                    dtype=np.uint8)
+    return (ops, ids, objs)
+
+def acyclic(adj):
+    """
+    Given the adjacency of a directed graph as a list of bitmasks, where bit j
+    of adj[i] is set iff there is an edge from node i to node j, returns
+    whether the graph is acyclic.
+
+    >>> acyclic([0b010, 0b100, 0b000])
+    True
+    >>> acyclic([0b010, 0b100, 0b001])
+    False
+    """
+    closure = list(adj)
+    changed = True
+    while changed:
+        changed = False
+        for (n, reach) in enumerate(closure):
+            m = reach
+            while m:
+                low = m & -m
+                reach |= closure[low.bit_length() - 1]
+                m ^= low
+            if reach != closure[n]:
+                closure[n] = reach
+                changed = True
+    return not any(reach & (1 << n) for (n, reach) in enumerate(closure))
+
 def transaction_ids(schedule):
     """
     Return a list of the _unique_ transaction ids in the schedule in the order
@@ -65,8 +110,10 @@ def transaction_ids(schedule):
     [1, 2, 3]
     """
     js = []
+    seen = set()
     for a in schedule:
-        if a.i not in js:
+        if a.i not in seen:
+            seen.add(a.i)
             js.append(a.i)
     return js
 
@@ -111,6 +158,8 @@ def drop_aborts(schedule):
     [R_2(A), Commit_2]
     """
     aborteds = {a.i for a in schedule if a.op == ABORT}
+    if not aborteds:
+        return list(schedule)
     return [a for a in schedule if a.i not in aborteds]
 
 def add_commits(schedule):
@@ -121,9 +170,30 @@ def add_commits(schedule):
     >>> add_commits([r(1, "A"), r(2, "A"), r(3, "A"), r(4, "A"), commit(2), abort(4)])
     [R_1(A), R_2(A), R_3(A), R_4(A), Commit_2, Abort_4, Commit_1, Commit_3]
     """
-    ends = {a.i for a in schedule if a.op == COMMIT or a.op == ABORT}
-    no_ends = [i for i in transaction_ids(schedule) if i not in ends]
-    return schedule + [commit(i) for i in no_ends]
+    return list(with_commits(schedule))
+
+def with_commits(schedule):
+    """
+    Yields the actions of a schedule followed by a commit for every
+    transaction that doesn't end in a commit or abort: the same actions as
+    add_commits without building the intermediate list.
+
+    >>> list(with_commits([r(1, "A"), r(2, "A"), r(3, "A"), commit(2)]))
+    [R_1(A), R_2(A), R_3(A), Commit_2, Commit_1, Commit_3]
+    """
+    ends = set()
+    js = []
+    seen = set()
+    for a in schedule:
+        if a.op == COMMIT or a.op == ABORT:
+            ends.add(a.i)
+        if a.i not in seen:
+            seen.add(a.i)
+            js.append(a.i)
+        yield a
+    for i in js:
+        if i not in ends:
+            yield commit(i)
 
 def first_read(schedule):
     """
@@ -187,6 +257,28 @@ def view_graph(schedule):
             pass
     return G
 
+def view_edges(schedule):
+    """
+    The edges of the view graph of a schedule as a frozenset. Every node of a
+    view graph has an edge, so two schedules have equal view graphs iff they
+    have equal view edges; the frozenset is much cheaper to build and compare
+    than a DiGraph.
+
+    >>> ve = view_edges([w(1, "A"), r(2, "A"), r(1, "A")])
+    >>> ve == frozenset([((0, r(2, "A")), (0, w(1, "A"))),
+    ...                  ((1, r(1, "A")), (0, w(1, "A")))])
+    True
+    """
+    edges = set()
+    last_written = {}
+    for (i, a) in number(schedule):
+        if a.op == WRITE:
+            last_written[a.obj] = (i, a)
+        elif a.op == READ:
+            if a.obj in last_written:
+                edges.add(((i, a), last_written[a.obj]))
+    return frozenset(edges)
+
 def last_written(schedule):
     """
     Returns a mapping from each object to the transaction id that last writes
@@ -197,11 +289,9 @@ def last_written(schedule):
     >>> last_written([w(1, "A"), w(2, "B"), w(2, "A")])
     {'A': 2, 'B': 2}
     """
-    lw = {}
-    for a in schedule:
-        if a.op == WRITE:
-            lw[a.obj] = a.i
-    return lw
+    # Later writes overwrite earlier ones, so the comprehension leaves each
+    # object mapped to its final writer.
+    return {a.obj: a.i for a in schedule if a.op == WRITE}
 
 def view_equivalent(s1, s2):
     """
@@ -221,7 +311,7 @@ def view_equivalent(s1, s2):
         return False
 
     # condition 2
-    if not graphs_eq(view_graph(s1), view_graph(s2)):
+    if not (view_edges(s1) == view_edges(s2)):
         return False
 
     # condition 3
@@ -261,68 +351,105 @@ def view_serializable(schedule):
         return False
 
     # brute force check over all serializations to see if the schedule is view
-    # equivalent to any serial schedule over the same set of transactions
-    for s in itertools.permutations(transactions(schedule)):
+    # equivalent to any serial schedule over the same set of transactions. The
+    # reference first reads, last writes, and view graph are computed once up
+    # front, and each permutation is vetted against the cheap dict comparisons
+    # before its view edges are built.
+    fr_ref = first_read(schedule)
+    lw_ref = last_written(schedule)
+    ve_ref = view_edges(schedule)
+    for s in itertools.permutations(partitions):
         s = flatten(list(s))
-        if view_equivalent(s, schedule):
+        if last_written(s) != lw_ref:
+            continue
+        if first_read(s) != fr_ref:
+            continue
+        if view_edges(s) == ve_ref:
             return True
     return False
 
+# conflict_serializable is called on the same schedule by view_serializable,
+# by the generators in schedule.py, and by the tests, so its results are
+# cached keyed on the tuple of actions.
+_conflict_serializable = {}
+
 def conflict_serializable(schedule):
     """
     A schedule is conflict serializable if its conflict graph is acyclic.
     Aborted transactions are ignored.
     """
-    return len(list(nx.simple_cycles(conflict_graph(schedule)))) == 0
+    key = tuple(schedule)
+    if key in _conflict_serializable:
+        return _conflict_serializable[key]
+    schedule = drop_aborts(schedule)
+
+    # The conflict graph has one node per transaction and schedules only ever
+    # have a handful of transactions, so a bitmask per node is far cheaper
+    # than building a networkx graph just to test acyclicity. With fewer than
+    # two transactions there can be no conflicts at all.
+    pos = {i: n for (n, i) in enumerate(transaction_ids(schedule))}
+    if len(pos) < 2:
+        cs = True
+    else:
+        adj = [0] * len(pos)
+        for (i, j) in conflict_edges(schedule):
+            adj[pos[i]] |= 1 << pos[j]
+        cs = acyclic(adj)
+    _conflict_serializable[key] = cs
+    return cs
 
 def recoverable(schedule):
     """
     A schedule is recoverable if all the transactions whose changes it read
     commit and the schedule commits after them.
     """
-    schedule = add_commits(schedule)
-
     written_by = defaultdict(list) # object -> ids
     read_from  = defaultdict(set)  # id -> ids
     committed  = set()             # ids
-    for a in schedule:
+    aborted    = set()             # ids
+    for a in with_commits(schedule):
         if a.op == WRITE:
             written_by[a.obj].append(a.i)
         elif a.op == READ:
-            if a.obj in written_by and  \
-                   len(written_by[a.obj]) > 0 and \
-                   written_by[a.obj][-1] != a.i:
-               read_from[a.i].add(written_by[a.obj][-1])
+            if a.obj in written_by:
+                # Writes by aborted transactions are discarded lazily: only
+                # the last writer is ever consulted, so it suffices to pop
+                # stale writers off the end here.
+                ids = written_by[a.obj]
+                while ids and ids[-1] in aborted:
+                    ids.pop()
+                if ids and ids[-1] != a.i:
+                    read_from[a.i].add(ids[-1])
         elif a.op == COMMIT:
             if not all(i in committed for i in read_from[a.i]):
                 return False
             committed.add(a.i)
         elif a.op == ABORT:
-            for (o, ids) in written_by.iteritems():
-                written_by[o] = [i for i in ids if i != a.i]
+            aborted.add(a.i)
 
     return True
 
 def aca(schedule):
     """A schedule avoids cascading aborts if it only reads commited changes."""
-    schedule = add_commits(schedule)
-
     last_write = defaultdict(list) # object -> ids
     committed  = set()             # ids
-    for a in schedule:
+    aborted    = set()             # ids
+    for a in with_commits(schedule):
         if a.op == WRITE:
             last_write[a.obj].append(a.i)
         elif a.op == READ:
-            if a.obj in last_write and \
-                    len(last_write[a.obj]) > 0 and \
-                    last_write[a.obj][-1] not in committed \
-                    and last_write[a.obj][-1] != a.i:
-                return False
+            if a.obj in last_write:
+                # Lazily discard writes by aborted transactions; see
+                # recoverable.
+                ids = last_write[a.obj]
+                while ids and ids[-1] in aborted:
+                    ids.pop()
+                if ids and ids[-1] not in committed and ids[-1] != a.i:
+                    return False
         elif a.op == COMMIT:
             committed.add(a.i)
         elif a.op == ABORT:
-            for (o, ids) in last_write.iteritems():
-                last_write[o] = [i for i in ids if i != a.i]
+            aborted.add(a.i)
 
     return True
 
@@ -331,24 +458,25 @@ def strict(schedule):
     A schedule is strict if never reads or writes to an uncommited changed
     variable.
     """
-    schedule = add_commits(schedule)
-
     last_write = defaultdict(list) # object -> id
     committed  = set()             # ids
-    for a in schedule:
+    aborted    = set()             # ids
+    for a in with_commits(schedule):
         if a.op == WRITE or a.op == READ:
-            if a.obj in last_write and \
-                    len(last_write[a.obj]) > 0 and \
-                    last_write[a.obj][-1] not in committed and \
-                    last_write[a.obj][-1] != a.i:
-                return False
+            if a.obj in last_write:
+                # Lazily discard writes by aborted transactions; see
+                # recoverable.
+                ids = last_write[a.obj]
+                while ids and ids[-1] in aborted:
+                    ids.pop()
+                if ids and ids[-1] not in committed and ids[-1] != a.i:
+                    return False
             if a.op == WRITE:
                 last_write[a.obj].append(a.i)
         elif a.op == COMMIT:
             committed.add(a.i)
         elif a.op == ABORT:
-            for (o, ids) in last_write.iteritems():
-                last_write[o] = [i for i in ids if i != a.i]
+            aborted.add(a.i)
 
     return True
 
@@ -372,42 +500,93 @@ def tex(schedule):
     +--------+--------+--------+
     """
     transactions = sorted(transaction_ids(schedule))
-    s = r"\begin{tabular}{" + ("|" + "|".join("c" for _ in transactions) + "|" )+ "}\n"
-    s += r"\hline" + "\n"
-    s += "&".join("$T_{}$".format(t) for t in transactions) + r"\\\hline" + "\n"
+    pos = {t: i for (i, t) in enumerate(transactions)}
+    # The column separators on either side of a cell depend only on the
+    # transaction, so compute them once instead of once per row, and collect
+    # the rows into a list to avoid quadratic string concatenation.
+    left  = {t: "&" * pos[t] for t in transactions}
+    right = {t: "&" * (len(transactions) - 1 - pos[t]) for t in transactions}
+    lines = [r"\begin{tabular}{" + ("|" + "|".join("c" for _ in transactions) + "|" )+ "}",
+             r"\hline",
+             "&".join("$T_{}$".format(t) for t in transactions) + r"\\\hline"]
     for a in schedule:
-        index = transactions.index(a.i)
-        s += ("&" * index) + a.tex() + ("&" * (len(transactions) - 1 - index))
-        s += r"\\\hline" + "\n"
-    s += r"\end{tabular}" + "\n"
-    return s
+        lines.append(left[a.i] + a.tex() + right[a.i] + r"\\\hline")
+    lines.append(r"\end{tabular}")
+    return "\n".join(lines) + "\n"
+
+def conflict_edges(schedule):
+    """
+    The edges of the conflict graph of a schedule: the set of pairs (i, j)
+    where transaction i acts on an object, transaction j later acts on the
+    same object, and at least one of the two actions is a write. Aborted
+    transactions are ignored.
+
+    >>> sorted(conflict_edges([r(1, "A"), w(2, "A"), w(1, "A")]))
+    [(1, 2), (2, 1)]
+    """
+    schedule = drop_aborts(schedule)
+
+    # Bucket the reads and writes by object so that we only ever compare
+    # actions that can actually conflict; commits and aborts never do, and
+    # neither do actions on different objects. The buckets hold plain
+    # (id, op) pairs so the quadratic loop below indexes tuples rather than
+    # chasing Action attributes.
+    by_obj = defaultdict(list)
+    for a in schedule:
+        if a.op == READ or a.op == WRITE:
+            by_obj[a.obj].append((a.i, a.op))
+
+    edges = set()
+    for actions in by_obj.values():
+        writes = [(j, i) for (j, (i, op)) in enumerate(actions) if op == WRITE]
+        for (j, (ai, aop)) in enumerate(actions):
+            # A write conflicts with every later action on the object; a read
+            # conflicts only with later writes.
+            if aop == WRITE:
+                laters = [bi for (bi, bop) in actions[j+1:]]
+            else:
+                laters = [bi for (k, bi) in writes if k > j]
+            for bi in laters:
+                if ai != bi:
+                    edges.add((ai, bi))
+    return edges
 
 def conflict_graph(schedule):
     """
     A graph with an edge from a to b for each pair of actions (a, b) from
     different transactions on the same object where at least one of the actions
     is a write and a precedes b.
+
+    The networkx graph is for drawing and inspection; conflict_serializable
+    works straight off conflict_edges and never builds one.
     """
     schedule = drop_aborts(schedule)
     G = nx.DiGraph()
     G.add_nodes_from(transaction_ids(schedule))
-
-    for (i, a) in enumerate(schedule):
-        for b in schedule[i+1:]:
-            same_obj = a.obj == b.obj
-            diff_txn = a.i != b.i
-            conflict = a.op == WRITE or b.op == WRITE
-            if same_obj and diff_txn and conflict:
-                G.add_edge(a.i, b.i)
+    G.add_edges_from(conflict_edges(schedule))
     return G
 
-def draw(G):
-    """Prettily draw a networkx graph G."""
-    plt.figure()
+def draw(G, ax=None):
+    """Prettily draw a networkx graph G, onto the axes ax if given."""
+    # matplotlib takes a couple hundred milliseconds to import, and draw is
+    # the only function here that needs it, so it is imported lazily. Callers
+    # that never draw never pay for it.
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        plt.figure()
+        ax = plt.gca()
     color_range = np.linspace(0, 1, len(G.nodes()))
     labels = {n: "$T_{{{}}}$".format(n) for n in G}
-    pos = nx.spectral_layout(G)
+    # Conflict graphs almost always have at most three nodes, and
+    # spectral_layout does real linear algebra, so lay small graphs out on a
+    # fixed triangle instead.
+    if len(G) <= 3:
+        pos = dict(zip(G.nodes(), [(0, 0), (1, 0), (0.5, 0.866)]))
+    else:
+        pos = nx.spectral_layout(G)
     kwargs = {
+        "ax": ax,
         "alpha": 1.0,
         "cmap": plt.get_cmap("Dark2"), # http://bit.ly/1ItQDgE
         "font_color": "w",